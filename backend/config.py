@@ -2,51 +2,106 @@
 Configuration module for Ganesha Voice Chatbot
 """
 import os
-import json
-from typing import List
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Tuple
 from pathlib import Path
+import orjson
 from dotenv import load_dotenv
 
 # Define the base directory
 BASE_DIR = Path(__file__).resolve().parent
 
+@lru_cache(maxsize=1)
+def _load_env() -> bool:
+    """Loads the .env file once per process, even if this module is imported repeatedly."""
+    return load_dotenv(dotenv_path=BASE_DIR / ".env")
+
 # Load the .env file
-load_dotenv(dotenv_path=BASE_DIR / ".env")
+_load_env()
+
+# Snapshot of the process environment, taken once after the .env file is loaded
+_ENV = os.environ.copy()
+
+def _to_bool(value: str) -> bool:
+    return value.lower() == "true"
+
+@lru_cache(maxsize=None)
+def _get(name: str, default: str, cast: Callable[[str], Any] = str) -> Any:
+    """Reads an environment variable and caches its cast value, so parsing runs exactly once."""
+    return cast(_ENV.get(name, default))
 
 def _get_cors_origins() -> List[str]:
     """Helper function to parse CORS origins from environment variables."""
-    cors_env = os.getenv("CORS_ORIGINS")
+    cors_env = _ENV.get("CORS_ORIGINS")
     if cors_env:
         try:
             # Try to parse it as a JSON list
-            return json.loads(cors_env)
-        except json.JSONDecodeError:
+            return orjson.loads(cors_env)
+        except orjson.JSONDecodeError:
             # If it's not JSON, treat it as a comma-separated string
             return [origin.strip() for origin in cors_env.split(',')]
     # Fallback to FRONTEND_URL or localhost
-    return [os.getenv("FRONTEND_URL", "http://localhost:3000")]
+    return [_get("FRONTEND_URL", "http://localhost:3000")]
+
+_SUPPORTED_LANGUAGES = {
+    "hi": "Hindi", "en": "English", "ta": "Tamil", "te": "Telugu",
+    "kn": "Kannada", "ml": "Malayalam", "bn": "Bengali", "mr": "Marathi",
+    "gu": "Gujarati", "pa": "Punjabi", "or": "Odia", "as": "Assamese", "ur": "Urdu"
+}
 
+@dataclass(frozen=True, slots=True)
 class Settings:
     # Server Configuration
-    DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
-    HOST: str = os.getenv("HOST", "0.0.0.0")
-    PORT: int = int(os.getenv("PORT", "8000"))
-    
+    DEBUG: bool = _get("DEBUG", "True", _to_bool)
+    HOST: str = _get("HOST", "0.0.0.0")
+    PORT: int = _get("PORT", "8000", int)
+    MAX_FILE_SIZE: int = _get("MAX_FILE_SIZE", "50000000", int)
+    # Disable when a reverse proxy (e.g. Nginx) serves /outputs directly with sendfile
+    SERVE_OUTPUTS: bool = _get("SERVE_OUTPUTS", "True", _to_bool)
+    # Uploaded recordings and generated audio older than FILE_MAX_AGE seconds are swept periodically
+    FILE_MAX_AGE: int = _get("FILE_MAX_AGE", "900", int)
+    FILE_CLEANUP_INTERVAL: int = _get("FILE_CLEANUP_INTERVAL", "300", int)
+
     # Model Configuration
-    WHISPER_MODEL: str = os.getenv("WHISPER_MODEL", "tiny") # Changed default to tiny
-    LLM_MODEL: str = os.getenv("LLM_MODEL", "gemini-1.5-flash-latest")
-    
+    WHISPER_MODEL: str = _get("WHISPER_MODEL", "tiny") # Changed default to tiny
+    # Greedy decoding by default; larger beams trade speed for accuracy (mainly worthwhile on GPU)
+    ASR_BEAM_SIZE: int = _get("ASR_BEAM_SIZE", "1", int)
+    # Chunks decoded together by the batched Whisper pipeline on GPU (1 disables batching)
+    ASR_BATCH_SIZE: int = _get("ASR_BATCH_SIZE", "8", int)
+    # Optional fastText language-ID model (lid.176.ftz) used instead of langdetect when present
+    LID_MODEL_PATH: str = _get("LID_MODEL_PATH", "./models/lid.176.ftz")
+    # Maximum number of concurrent Whisper transcriptions
+    ASR_CONCURRENCY: int = _get("ASR_CONCURRENCY", "1", int)
+    LLM_MODEL: str = _get("LLM_MODEL", "gemini-1.5-flash-latest")
+
+    LANGUAGE_DETECT_CACHE_SIZE: int = _get("LANGUAGE_DETECT_CACHE_SIZE", "0", int)
+
+    # Number of Gemini replies kept in the in-memory LRU cache (0 disables it)
+    LLM_RESPONSE_CACHE_SIZE: int = _get("LLM_RESPONSE_CACHE_SIZE", "2048", int)
+    # Seconds a cached reply stays valid before Gemini is asked again
+    LLM_RESPONSE_CACHE_TTL: float = _get("LLM_RESPONSE_CACHE_TTL", "3600", float)
+    # Maximum number of Gemini requests in flight at once
+    LLM_MAX_CONCURRENCY: int = _get("LLM_MAX_CONCURRENCY", "10", int)
+
     # Gemini Pro Configuration
-    GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
-    
+    GEMINI_API_KEY: str = field(default=_get("GEMINI_API_KEY", ""), repr=False)
+
+    # Text-to-speech cache: finished clips by content hash, pruned to TTS_CACHE_MAX_MB (0 disables it)
+    TTS_CACHE_DIR: str = _get("TTS_CACHE_DIR", "./tts_cache")
+    TTS_CACHE_MAX_MB: int = _get("TTS_CACHE_MAX_MB", "256", int)
+    # Longer texts are cut at a word boundary before synthesis
+    TTS_MAX_CHARS: int = _get("TTS_MAX_CHARS", "2000", int)
+    # Maximum number of concurrent Edge TTS connections
+    TTS_MAX_CONCURRENCY: int = _get("TTS_MAX_CONCURRENCY", "8", int)
+
     # CORS Configuration
-    CORS_ORIGINS: List[str] = _get_cors_origins()
-    
+    CORS_ORIGINS: List[str] = field(default_factory=_get_cors_origins)
+    # Same origins as a set, for O(1) membership checks in the CORS middleware
+    CORS_ORIGINS_SET: FrozenSet[str] = field(default_factory=lambda: frozenset(_get_cors_origins()))
+
     # Language Support
-    SUPPORTED_LANGUAGES = {
-        "hi": "Hindi", "en": "English", "ta": "Tamil", "te": "Telugu",
-        "kn": "Kannada", "ml": "Malayalam", "bn": "Bengali", "mr": "Marathi",
-        "gu": "Gujarati", "pa": "Punjabi", "or": "Odia", "as": "Assamese", "ur": "Urdu"
-    }
+    SUPPORTED_LANGUAGES: Dict[str, str] = field(default_factory=lambda: dict(_SUPPORTED_LANGUAGES))
+    SUPPORTED_LANGUAGE_KEYS: Tuple[str, ...] = tuple(_SUPPORTED_LANGUAGES)
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -2,129 +2,273 @@
 Lord Ganesha Voice Chatbot - FastAPI Backend (Optimized for Hackathon)
 """
 import os
+import time
 import uuid
 import logging
 from pathlib import Path
 import asyncio
-import shutil
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+import orjson
 import uvicorn
 from contextlib import asynccontextmanager
 
 from config import settings
+from schemas import TextChatResponse, VoiceChatResponse
 from services import asr_service, llm_service, tts_service
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - [%(levelname)s] - %(message)s')
 logger = logging.getLogger(__name__)
 
-thread_pool_executor = ThreadPoolExecutor()
+IO_POOL_WORKERS = 8
+
+# Blocking file I/O and langid run here instead of on the event loop. Whisper inference uses
+# the ASR service's own bounded pool so concurrent transcriptions cannot thrash the CPU/GPU.
+io_executor = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="io")
+
+SESSION_ID_BATCH = 256
+_session_id_pool: deque = deque()
+
+def new_session_id() -> str:
+    """Returns a random UUID4 string, drawing entropy in batches to amortize the getrandom syscall."""
+    if not _session_id_pool:
+        entropy = os.urandom(16 * SESSION_ID_BATCH)
+        _session_id_pool.extend(str(uuid.UUID(bytes=entropy[i:i + 16], version=4)) for i in range(0, len(entropy), 16))
+    return _session_id_pool.popleft()
+
+UPLOAD_DIR = Path("uploads")
+OUTPUT_DIR = Path("outputs")
+# Prefix for per-request output paths, so the hot path is a plain string concat
+OUTPUT_DIR_PREFIX = str(OUTPUT_DIR) + os.sep
+
+async def initialize_services():
+    services = {"asr": asr_service, "llm": llm_service, "tts": tts_service}
+    # Model loads are independent, so overlap them: wall-clock is the slowest load, not the sum.
+    results = await asyncio.gather(*(service.initialize() for service in services.values()), return_exceptions=True)
+    failed = [name for name, result in zip(services, results) if isinstance(result, BaseException)]
+    for name, result in zip(services, results):
+        if isinstance(result, BaseException):
+            logger.error("Failed to initialize %s service: %r", name, result)
+    if failed:
+        logger.warning("Services initialized with failures: %s", ", ".join(failed))
+    else:
+        logger.info("All services initialized!")
+    if "tts" not in failed:
+        await tts_service.prewarm(llm_service.fallback_responses())
+
+def sweep_old_files(max_age: float, *directories: Path) -> int:
+    """Deletes regular files older than max_age seconds from the given directories."""
+    cutoff = time.time() - max_age
+    removed = 0
+    for directory in directories:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                            os.unlink(entry.path)
+                            removed += 1
+                    except FileNotFoundError:
+                        pass
+        except FileNotFoundError:
+            continue
+    return removed
+
+async def cleanup_loop():
+    while True:
+        await asyncio.sleep(settings.FILE_CLEANUP_INTERVAL)
+        try:
+            removed = await run_in_thread_pool(sweep_old_files, settings.FILE_MAX_AGE, UPLOAD_DIR, OUTPUT_DIR)
+            removed += await run_in_thread_pool(tts_service.prune_cache)
+            if removed:
+                logger.info("Cleanup removed %d old audio files.", removed)
+        except Exception as e:
+            logger.error("File cleanup failed: %s", e, exc_info=True)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    logger.info("Initializing Lord Ganesha Voice Chatbot...")
-    initialization_tasks = [asr_service.initialize(), llm_service.initialize(), tts_service.initialize()]
-    await asyncio.gather(*initialization_tasks, return_exceptions=True)
-    logger.info("All services initialized!")
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    # Services load in the background so the server accepts connections immediately;
+    # /health reports 503 until every service is ready.
+    loop = asyncio.get_running_loop()
+    logger.info("Event loop: %s.%s", type(loop).__module__, type(loop).__name__)
+    logger.info("Initializing Lord Ganesha Voice Chatbot in the background...")
+    initialization_task = asyncio.create_task(initialize_services())
+    cleanup_task = asyncio.create_task(cleanup_loop())
     yield
     logger.info("Shutting down Ganesha Voice Chatbot.")
-    thread_pool_executor.shutdown(wait=True)
+    initialization_task.cancel()
+    cleanup_task.cancel()
+    asr_service.shutdown()
+    tts_service.shutdown()
+    io_executor.shutdown(wait=True)
 
 app = FastAPI(title="Lord Ganesha Voice Chatbot", version="1.5.0", lifespan=lifespan)
-app.add_middleware(CORSMiddleware, allow_origins=settings.CORS_ORIGINS, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_origins=settings.CORS_ORIGINS_SET, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
-UPLOAD_DIR = Path("uploads")
-OUTPUT_DIR = Path("outputs")
-UPLOAD_DIR.mkdir(exist_ok=True)
-OUTPUT_DIR.mkdir(exist_ok=True)
-app.mount("/outputs", StaticFiles(directory=OUTPUT_DIR), name="outputs")
+if settings.SERVE_OUTPUTS:
+    # The directory is created in lifespan, after the mount is registered.
+    app.mount("/outputs", StaticFiles(directory=OUTPUT_DIR, check_dir=False), name="outputs")
 
-def save_upload_file_sync(upload_file: UploadFile, destination: Path):
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+class UploadTooLargeError(Exception):
+    pass
+
+def save_upload_file_sync(upload_file: UploadFile, destination: Path, max_size: int = settings.MAX_FILE_SIZE):
+    """Streams an upload to disk in fixed-size chunks, enforcing max_size without buffering the whole file."""
+    written = 0
     try:
         with destination.open("wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
+            while chunk := upload_file.file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > max_size:
+                    raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+                buffer.write(chunk)
+    except UploadTooLargeError:
+        destination.unlink(missing_ok=True)
+        raise
     finally:
         upload_file.file.close()
 
-async def run_in_thread_pool(func, *args):
+async def run_in_thread_pool(func, *args, executor: ThreadPoolExecutor = io_executor):
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(thread_pool_executor, func, *args)
+    return await loop.run_in_executor(executor, func, *args)
 
 @app.get("/", summary="Root endpoint with basic info")
 async def root():
     return {"message": "Welcome to the Lord Ganesha Voice Chatbot API"}
 
+HEALTH_CACHE_TTL = 5.0
+_health_cache = {"ts": float("-inf"), "value": None}
+
 @app.get("/health", summary="Health check for all services")
 async def health_check():
-    asr_status, llm_status, tts_status = asr_service.is_initialized(), llm_service.is_initialized(), tts_service.is_initialized()
-    healthy = asr_status and llm_status and tts_status
-    return JSONResponse(status_code=200 if healthy else 503, content={"status": "healthy" if healthy else "unhealthy", "services": {"asr": "ready" if asr_status else "not ready", "llm": "ready" if llm_status else "not ready", "tts": "ready" if tts_status else "not ready"}})
+    # Probes hit this every few seconds; reuse the last status for HEALTH_CACHE_TTL seconds.
+    now = time.monotonic()
+    if _health_cache["value"] is None or now - _health_cache["ts"] >= HEALTH_CACHE_TTL:
+        asr_status, llm_status, tts_status = asr_service.is_initialized(), llm_service.is_initialized(), tts_service.is_initialized()
+        healthy = asr_status and llm_status and tts_status
+        _health_cache["value"] = (200 if healthy else 503, {"status": "healthy" if healthy else "unhealthy", "services": {"asr": "ready" if asr_status else "not ready", "llm": "ready" if llm_status else "not ready", "tts": "ready" if tts_status else "not ready"}})
+        _health_cache["ts"] = now
+    status_code, content = _health_cache["value"]
+    return JSONResponse(status_code=status_code, content=content)
 
 
 async def process_chat(user_input: str, input_language_hint: str, session_id: str):
-    logger.info(f"Generating Ganesha's response for session {session_id} with language hint '{input_language_hint}'...")
+    logger.debug("Generating Ganesha's response for session %s with language hint '%s'...", session_id, input_language_hint)
     response_text = await llm_service.get_response(user_input, input_language_hint)
-    
+    response_language, audio_url = await synthesize_reply(response_text, session_id)
+    return response_text, response_language, audio_url
+
+async def synthesize_reply(response_text: str, session_id: str):
     # --- THE CRITICAL FIX IS HERE ---
     # Detect the language of the *actual response* from the LLM.
     # This is the most reliable way to determine the correct voice for TTS.
-    response_language = llm_service.detect_language_fast(response_text)
+    # langid scoring is CPU-bound, so keep it off the event loop.
+    response_language = await run_in_thread_pool(llm_service.detect_language_fast, response_text)
     
-    logger.info(f"Ganesha responds (Detected: {response_language}): {response_text}")
+    logger.info("Ganesha responds (Detected: %s): %s", response_language, response_text)
     
-    logger.info("🎵 Converting text to divine speech...")
+    logger.debug("🎵 Converting text to divine speech...")
     audio_filename = f"{session_id}_response.mp3"
-    audio_output_path = OUTPUT_DIR / audio_filename
+    audio_output_path = OUTPUT_DIR_PREFIX + audio_filename
     
-    tts_success = await tts_service.generate_speech(response_text, response_language, str(audio_output_path))
+    tts_success = await tts_service.generate_speech(response_text, response_language, audio_output_path)
     
-    return response_text, response_language, f"/outputs/{audio_filename}" if tts_success else None
+    return response_language, f"/outputs/{audio_filename}" if tts_success else None
 
-@app.post("/chat", summary="Handle voice-based chat")
+def sse_event(data: dict, event: str | None = None) -> bytes:
+    """Encodes one server-sent event; the payload is a single line of JSON."""
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
+@app.post("/chat", summary="Handle voice-based chat", response_model=VoiceChatResponse)
 async def voice_chat(audio: UploadFile = File(...)):
     if not audio.content_type or not audio.content_type.startswith('audio/'):
         raise HTTPException(status_code=400, detail="Invalid file type.")
     
-    session_id = str(uuid.uuid4())
-    logger.info(f"New voice chat session: {session_id}")
+    if not asr_service.is_initialized():
+        raise HTTPException(status_code=503, detail="Speech recognition is still loading. Please try again shortly.")
+    
+    session_id = new_session_id()
+    logger.info("New voice chat session: %s", session_id)
     
-    file_extension = Path(audio.filename).suffix or ".webm"
+    file_extension = os.path.splitext(audio.filename or "")[1] or ".webm"
     audio_path = UPLOAD_DIR / f"{session_id}_recording{file_extension}"
     
-    await run_in_thread_pool(save_upload_file_sync, audio, audio_path)
-    logger.info(f"Saved audio to {audio_path}")
+    try:
+        await run_in_thread_pool(save_upload_file_sync, audio, audio_path)
+    except UploadTooLargeError:
+        raise HTTPException(status_code=413, detail="Audio file is too large.")
+    logger.debug("Saved audio to %s", audio_path)
     
-    logger.info("Converting speech to text (offloaded to thread pool)...")
-    transcription_result = await run_in_thread_pool(asr_service.transcribe_audio, str(audio_path))
+    logger.debug("Converting speech to text (offloaded to ASR thread pool)...")
+    transcription_result = await asr_service.atranscribe_audio(str(audio_path))
     
     if transcription_result is None:
         raise HTTPException(status_code=400, detail="Could not understand the audio. No speech detected.")
         
     user_text, detected_language = transcription_result
-    logger.info(f"Transcribed ({detected_language}): {user_text}")
+    logger.info("Transcribed (%s): %s", detected_language, user_text)
     
     response_text, response_language, audio_url = await process_chat(user_text, detected_language, session_id)
     
-    return {"session_id": session_id, "transcription": user_text, "user_message": user_text, "language": detected_language, "response": response_text, "response_language": response_language, "audio_url": audio_url}
+    return VoiceChatResponse(session_id=session_id, transcription=user_text, user_message=user_text, language=detected_language, response=response_text, response_language=response_language, audio_url=audio_url)
 
-@app.post("/text-chat", summary="Handle text-based chat")
+@app.post("/text-chat", summary="Handle text-based chat", response_model=TextChatResponse)
 async def text_chat(text: str = Form(...)):
     if not text.strip():
         raise HTTPException(status_code=400, detail="Text input cannot be empty.")
     
-    session_id = str(uuid.uuid4())
-    logger.info(f"New text chat session: {session_id}")
+    session_id = new_session_id()
+    logger.info("New text chat session: %s", session_id)
     
-    detected_language = llm_service.detect_language_fast(text)
-    logger.info(f"User message (Detected hint: {detected_language}): '{text}'")
+    detected_language = await run_in_thread_pool(llm_service.detect_language_fast, text)
+    logger.info("User message (Detected hint: %s): '%s'", detected_language, text)
     
     response_text, response_language, audio_url = await process_chat(text, detected_language, session_id)
 
-    return {"session_id": session_id, "user_message": text, "language": detected_language, "response": response_text, "response_language": response_language, "audio_url": audio_url}
+    return TextChatResponse(session_id=session_id, user_message=text, language=detected_language, response=response_text, response_language=response_language, audio_url=audio_url)
+
+@app.post("/text-chat/stream", summary="Stream a text-based chat reply as server-sent events")
+async def text_chat_stream(text: str = Form(...)):
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text input cannot be empty.")
+    
+    session_id = new_session_id()
+    logger.info("New streaming text chat session: %s", session_id)
+    
+    detected_language = await run_in_thread_pool(llm_service.detect_language_fast, text)
+    
+    async def events():
+        # Text deltas go out as Gemini produces them; the voice is synthesized once the reply is complete.
+        yield sse_event({"session_id": session_id, "language": detected_language}, event="start")
+        deltas = []
+        async for delta in llm_service.stream_response(text, detected_language):
+            deltas.append(delta)
+            yield sse_event({"delta": delta})
+        # Cleaned like the non-streaming path, so both endpoints (and the cache) return the same text.
+        response_text = llm_service.clean_response("".join(deltas))
+        response_language, audio_url = await synthesize_reply(response_text, session_id)
+        yield sse_event({"response": response_text, "response_language": response_language, "audio_url": audio_url}, event="done")
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/tts/stream", summary="Stream synthesized speech for a text as MP3")
+async def tts_stream(text: str = Form(...), language: str | None = Form(None)):
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text input cannot be empty.")
+    if language is None:
+        language = await run_in_thread_pool(llm_service.detect_language_fast, text)
+    # Audio bytes go out as Edge TTS produces them, so playback starts at first-chunk latency.
+    return StreamingResponse(tts_service.generate_speech_stream(text, language), media_type="audio/mpeg")
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host=settings.HOST, port=settings.PORT, reload=settings.DEBUG)
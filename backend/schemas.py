@@ -0,0 +1,16 @@
+"""
+Response models for the Ganesha Voice Chatbot API
+"""
+from typing import Optional
+from pydantic import BaseModel
+
+class TextChatResponse(BaseModel):
+    session_id: str
+    user_message: str
+    language: str
+    response: str
+    response_language: str
+    audio_url: Optional[str] = None
+
+class VoiceChatResponse(TextChatResponse):
+    transcription: str
@@ -1,56 +1,161 @@
-import torch
+import os
+import numpy as np
+import asyncio
 import logging
-from typing import Tuple, Optional
-from faster_whisper import WhisperModel
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Tuple, Optional
 from langdetect import detect, DetectorFactory, LangDetectException
 
 from config import settings
 
+if TYPE_CHECKING:
+    from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+try:
+    import fasttext
+except ImportError:
+    fasttext = None
+
 DetectorFactory.seed = 0
 logger = logging.getLogger(__name__)
 
+ARABIC_SCRIPT_START, ARABIC_SCRIPT_END = 0x0600, 0x06FF
+SHORT_TEXT_LENGTH = 64
+# One second of 16 kHz audio
+WARMUP_SAMPLES = 16000
+
+def _lazy_imports():
+    """
+    Imports torch and faster-whisper on first use. torch alone costs seconds and hundreds
+    of MB at import, which workers should not pay before they need ASR.
+    """
+    import torch
+    from faster_whisper import BatchedInferencePipeline, WhisperModel
+    return torch, WhisperModel, BatchedInferencePipeline
+
 class ASRService:
     def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.compute_type = "float16" if self.device == "cuda" else "int8"
-        self.model: Optional[WhisperModel] = None
+        # Device and compute type are resolved in initialize(), once torch has been imported.
+        self.device: Optional[str] = None
+        self.compute_type: Optional[str] = None
+        self.model: Optional["WhisperModel"] = None
+        self.batched_pipeline: Optional["BatchedInferencePipeline"] = None
+        self.lid_model = None
         self._initialized = False
-        logger.info(f"ASR Service configured for device: {self.device} with compute_type: {self.compute_type}")
+        # Bounded pool for blocking inference; CTranslate2 releases the GIL, so workers decode in parallel.
+        self._pool = ThreadPoolExecutor(max_workers=settings.ASR_CONCURRENCY, thread_name_prefix="asr")
 
     async def initialize(self):
         if self._initialized:
             return
         logger.info(f"Loading Whisper model '{settings.WHISPER_MODEL}'...")
         try:
-            self.model = WhisperModel(
+            torch, WhisperModel, BatchedInferencePipeline = await asyncio.to_thread(_lazy_imports)
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            # int8 weights halve the bytes moved per decoder step; activations stay fp16 on GPU.
+            self.compute_type = "int8_float16" if self.device == "cuda" else "int8"
+            logger.info(f"ASR Service configured for device: {self.device} with compute_type: {self.compute_type}")
+            # Model loading blocks for seconds; keep it off the event loop.
+            self.model = await asyncio.to_thread(
+                WhisperModel,
                 settings.WHISPER_MODEL,
                 device=self.device,
                 compute_type=self.compute_type,
+                cpu_threads=min(os.cpu_count() or 1, 8),
+                # One CTranslate2 worker per transcription the ASR executor may run concurrently
+                num_workers=settings.ASR_CONCURRENCY,
                 download_root="./models"
             )
+            # On GPU, batch VAD-split chunks through the encoder/decoder together.
+            if self.device == "cuda" and settings.ASR_BATCH_SIZE > 1:
+                self.batched_pipeline = BatchedInferencePipeline(model=self.model)
+            await asyncio.to_thread(self._warm_up)
+            self.lid_model = await asyncio.to_thread(self._load_lid_model)
             self._initialized = True
             logger.info(f"Whisper model '{settings.WHISPER_MODEL}' loaded successfully.")
         except Exception as e:
             logger.error(f"Failed to load Whisper model: {e}", exc_info=True)
             raise
 
+    def _warm_up(self):
+        """
+        Decodes one second of silence so kernel selection and allocator warmup happen
+        at startup instead of on the first user's request. Failures are non-fatal.
+        """
+        start = time.perf_counter()
+        try:
+            silence = np.zeros(WARMUP_SAMPLES, dtype=np.float32)
+            segments, _ = self.model.transcribe(silence, beam_size=1, vad_filter=False, language='en')
+            list(segments)
+            if self.batched_pipeline is not None:
+                segments, _ = self.batched_pipeline.transcribe(np.zeros(2 * WARMUP_SAMPLES, dtype=np.float32), batch_size=2, language='en')
+                list(segments)
+            logger.info(f"Whisper warmup finished in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            logger.warning(f"Whisper warmup failed, first request will be slower: {e}")
+
     def is_initialized(self) -> bool:
         return self._initialized
 
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
     def _overwrite_language_if_urdu(self, text: str, detected_language: str) -> str:
         """
         FIX: Checks for Arabic script characters to reliably identify Urdu,
         overriding Whisper's common confusion with Hindi.
         """
-        # The Arabic script has a specific Unicode range.
-        arabic_script_range = range(0x0600, 0x06FF + 1)
-        for char in text:
-            if ord(char) in arabic_script_range:
-                if detected_language != 'ur':
-                    logger.info(f"Script analysis overrides Whisper's detection. Language is Urdu ('ur').")
-                return 'ur'
+        # Pure-ASCII transcripts (English, romanized speech) cannot contain Arabic script.
+        if text.isascii():
+            return detected_language
+        # The Arabic script has a specific Unicode range. Short transcripts are cheaper to scan
+        # directly; longer ones are compared in a single vectorized pass.
+        if len(text) <= SHORT_TEXT_LENGTH:
+            has_arabic_script = any(ARABIC_SCRIPT_START <= ord(char) <= ARABIC_SCRIPT_END for char in text)
+        else:
+            codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+            has_arabic_script = bool(np.any((codes >= ARABIC_SCRIPT_START) & (codes <= ARABIC_SCRIPT_END)))
+        if has_arabic_script:
+            if detected_language != 'ur':
+                logger.info(f"Script analysis overrides Whisper's detection. Language is Urdu ('ur').")
+            return 'ur'
         return detected_language
 
+    def _load_lid_model(self):
+        """Loads the fastText language-ID model if the package and model file are available."""
+        if fasttext is None or not os.path.exists(settings.LID_MODEL_PATH):
+            logger.info("fastText language ID unavailable; using langdetect for fallback detection.")
+            return None
+        try:
+            return fasttext.load_model(settings.LID_MODEL_PATH)
+        except Exception as e:
+            logger.warning(f"Failed to load fastText model '{settings.LID_MODEL_PATH}': {e}")
+            return None
+
+    def _identify_language(self, text: str) -> Optional[str]:
+        """
+        Fallback language identification for when Whisper's guess is unsupported.
+        Uses fastText (C++, ~50 µs) when loaded, otherwise the pure-Python langdetect.
+        """
+        if self.lid_model is not None:
+            try:
+                # The low-level binding skips FastText.predict's np.array(..., copy=False), which numpy 2 rejects.
+                predictions = self.lid_model.f.predict(text.replace('\n', ' '), 1, 0.0, "strict")
+                if predictions:
+                    return predictions[0][1].replace('__label__', '')
+            except Exception as e:
+                logger.warning(f"fastText prediction failed, falling back to langdetect: {e}")
+        try:
+            return detect(text)
+        except LangDetectException:
+            return None # Keep the current detection if langdetect fails
+
+    async def atranscribe_audio(self, audio_path: str) -> Optional[Tuple[str, str]]:
+        """Runs transcribe_audio on the ASR thread pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, self.transcribe_audio, audio_path)
+
     def transcribe_audio(self, audio_path: str) -> Optional[Tuple[str, str]]:
         """
         Transcribes an audio file. This is a blocking, CPU/GPU-bound function.
@@ -61,12 +166,24 @@ class ASRService:
             return None
 
         try:
-            segments, info = self.model.transcribe(
+            if self.batched_pipeline is not None:
+                transcriber, batch_options = self.batched_pipeline, {"batch_size": settings.ASR_BATCH_SIZE}
+            else:
+                transcriber, batch_options = self.model, {}
+
+            segments, info = transcriber.transcribe(
                 audio_path,
-                beam_size=1,
+                beam_size=settings.ASR_BEAM_SIZE,
                 language=None,
+                # Only the joined text is used, so skip timestamp tokens and cross-segment conditioning.
+                condition_on_previous_text=False,
+                without_timestamps=True,
+                # Chat turns are short: trim padding around speech so fewer frames reach the encoder,
+                # and skip decoding chunks that are most likely silence.
                 vad_filter=True,
-                vad_parameters=dict(min_silence_duration_ms=500)
+                vad_parameters=dict(min_silence_duration_ms=300, speech_pad_ms=100, threshold=0.5),
+                no_speech_threshold=0.7,
+                **batch_options
             )
 
             transcribed_text = "".join(segment.text for segment in segments).strip()
@@ -82,12 +199,9 @@ class ASRService:
             detected_language = self._overwrite_language_if_urdu(transcribed_text, detected_language)
             
             if detected_language not in settings.SUPPORTED_LANGUAGES:
-                try:
-                    fallback_lang = detect(transcribed_text)
-                    if fallback_lang in settings.SUPPORTED_LANGUAGES:
-                        detected_language = fallback_lang
-                except LangDetectException:
-                    pass # Keep the current detection if langdetect fails
+                fallback_lang = self._identify_language(transcribed_text)
+                if fallback_lang in settings.SUPPORTED_LANGUAGES:
+                    detected_language = fallback_lang
 
             final_language = detected_language if detected_language in settings.SUPPORTED_LANGUAGES else 'en'
             
@@ -1,11 +1,94 @@
+import asyncio
+import hashlib
 import logging
+import random
 import re
+import time
+from collections import Counter, OrderedDict
+from collections.abc import AsyncIterator, Mapping
+from functools import lru_cache
+from types import MappingProxyType
 import httpx
-import langid
+from langid.langid import LanguageIdentifier, model as langid_model
+import numpy as np
+import orjson
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+LANGUAGE_DETECT_PREFIX = 128
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+JSON_HEADERS = {"Content-Type": "application/json"}
+# Transient Gemini statuses worth retrying, with exponential backoff between attempts
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+LLM_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+
+_MARKDOWN_RE = re.compile(r'[\*#\-]')
+# Speaker/label prefixes the model occasionally puts in front of its reply
+_ARTIFACT_RE = re.compile(r'(?:Response|Answer|Text|Ganesha|गणेश जी|விநாயகர்|గణేష్|ಗಣೇಶ|ഗണപതി|গণেশ|गणेश):\s*')
+_WS_RE = re.compile(r'\s+')
+_LETTER_RE = re.compile(r'[^\W\d_]')
+
+# Native script code point ranges (inclusive); a script's tag is its 1-based index here.
+_SCRIPT_RANGES = {
+    'ur': (0x0600, 0x06FF), 'hi': (0x0900, 0x097F),
+    'bn': (0x0980, 0x09FF), 'pa': (0x0A00, 0x0A7F),
+    'gu': (0x0A80, 0x0AFF), 'ta': (0x0B80, 0x0BFF),
+    'te': (0x0C00, 0x0C7F), 'kn': (0x0C80, 0x0CFF),
+    'ml': (0x0D00, 0x0D7F),
+}
+_SCRIPT_LANGUAGES = tuple(_SCRIPT_RANGES)
+# One character class per script as a named group, so a single C-level search reports which script matched.
+_SCRIPT_RE = re.compile('|'.join(f'(?P<{lang}>[{chr(start)}-{chr(end)}])' for lang, (start, end) in _SCRIPT_RANGES.items()))
+SHORT_TEXT_LENGTH = 64
+# Common function words used to tell Hindi from Marathi once Devanagari script is found.
+# Words both languages use (गणेश, भगवान, the Marathi question particle का) carry no signal and stay out.
+_HI_MARKERS = frozenset(['है', 'हैं', 'हूँ', 'की', 'को', 'में', 'से', 'मैं', 'मुझे', 'और', 'नहीं'])
+_MR_MARKERS = frozenset(['आहे', 'आहेत', 'आहात', 'चा', 'ची', 'च्या', 'मी', 'मला', 'तुम्ही', 'आणि', 'नाही', 'गणपती'])
+_PUNCT_TO_SPACE = str.maketrans({char: ' ' for char in '।॥,.!?;:"\'()'})
+# Lookup table mapping every BMP code point to its script tag (0 = no Indic/Urdu script).
+_SCRIPT_TABLE = np.zeros(0x10000, dtype=np.uint8)
+for _tag, (_start, _end) in enumerate(_SCRIPT_RANGES.values(), start=1):
+    _SCRIPT_TABLE[_start:_end + 1] = _tag
+
+# Served when Gemini is unavailable; built once and read-only.
+_FALLBACK_RESPONSES = MappingProxyType({
+    "en": "Om Gam Ganapataye Namaha! I am here to help you, dear devotee. Please share what's on your mind, and I shall guide you with wisdom and compassion.",
+    
+    "hi": "ॐ गं गणपतये नमः! मैं यहाँ आपकी सहायता के लिए हूँ, प्रिय भक्त। कृपया बताएं कि आपके मन में क्या है, और मैं आपको ज्ञान और करुणा से मार्गदर्शन दूंगा।",
+    
+    "ta": "ஓம் கம் கணபதயே நமக! நான் உங்களுக்கு உதவ இங்கே இருக்கிறேன், அன்பு பக்தரே। உங்கள் மனதில் என்ன இருக்கிறது என்று பகிர்ந்து கொள்ளுங்கள், நான் ஞானம் மற்றும் கருணையுடன் உங்களுக்கு வழிகாட்டுவேன்।",
+    
+    "te": "ఓం గం గణపతయే నమః! నేను మీకు సహాయం చేయడానికి ఇక్కడ ఉన్నాను, ప్రియమైన భక్తుడా। మీ మనస్సులో ఏమి ఉందో చెప్పండి, నేను జ్ఞానం మరియు కరుణతో మీకు మార్గదర్శనం చేస్తాను।",
+    
+    "kn": "ಓಂ ಗಂ ಗಣಪತಯೇ ನಮಃ! ನಾನು ನಿಮಗೆ ಸಹಾಯ ಮಾಡಲು ಇಲ್ಲಿದ್ದೇನೆ, ಪ್ರಿಯ ಭಕ್ತರೇ। ನಿಮ್ಮ ಮನಸ್ಸಿನಲ್ಲಿ ಏನಿದೆ ಎಂದು ಹಂಚಿಕೊಳ್ಳಿ, ನಾನು ಜ್ಞಾನ ಮತ್ತು ಕರುಣೆಯಿಂದ ನಿಮಗೆ ಮಾರ್ಗದರ್ಶನ ನೀಡುತ್ತೇನೆ।",
+    
+    "ml": "ഓം ഗം ഗണപതയേ നമഃ! നിങ്ങളെ സഹായിക്കാൻ ഞാൻ ഇവിടെയുണ്ട്, പ്രിയ ഭക്തനേ। നിങ്ങളുടെ മനസ്സിൽ എന്താണുള്ളതെന്ന് പങ്കിടുക, ഞാൻ ജ്ഞാനവും കരുണയും കൊണ്ട് നിങ്ങളെ നയിക്കും।",
+    
+    "bn": "ওম গং গণপতয়ে নমঃ! আমি এখানে আপনাকে সাহায্য করতে এসেছি, প্রিয় ভক্ত। আপনার মনে কী আছে তা শেয়ার করুন, আমি জ্ঞান ও করুণা দিয়ে আপনাকে পথ দেখাবো।",
+    
+    "mr": "ॐ गं गणपतये नमः! मी तुमची मदत करण्यासाठी येथे आहे, प्रिय भक्ता। तुमच्या मनात काय आहे ते सांगा, मी ज्ञान आणि करुणेने तुम्हाला मार्गदर्शन करीन।",
+})
+
+def _candidate_text(body: dict) -> str | None:
+    """Returns the first candidate's text from a Gemini response body, or None if it has none."""
+    try:
+        return body["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+@lru_cache(maxsize=1)
+def _language_identifier() -> LanguageIdentifier:
+    """
+    A private langid instance constrained to the supported languages once. Toggling the
+    global langid constraint per call rebuilt its tables every time and needed a lock.
+    """
+    identifier = LanguageIdentifier.from_modelstring(langid_model, norm_probs=False)
+    identifier.set_languages(settings.SUPPORTED_LANGUAGE_KEYS)
+    return identifier
+
 class GaneshaLLMService:
     def __init__(self):
         self._initialized = False
@@ -18,45 +101,143 @@ class GaneshaLLMService:
             "Keep your answers concise and meaningful, ideally a single paragraph of 4-5 sentences. "
             "Crucially, you MUST reply ONLY in the language the user has asked their question in."
         )
+        # Request parts that never change are built once; only the user turn is added per call.
+        self._static_payload = {
+            "systemInstruction": {"parts": [{"text": self.system_instruction}]},
+            # Stop if the model starts inventing the next turn. No paragraph-break stop: replies often open
+            # with a salutation line ("Om Gam Ganapataye Namaha! 🙏") and would be cut down to just that.
+            "generationConfig": {
+                "temperature": 0.7, "topP": 0.95, "maxOutputTokens": 256, "candidateCount": 1,
+                "stopSequences": ["User:", "Devotee:"],
+            },
+        }
+        # The serialized body is pre-templated around the user text, so a request only encodes that string.
+        static_body = orjson.dumps({**self._static_payload, "contents": [{"role": "user", "parts": [{"text": ""}]}]})
+        self._body_prefix, self._body_suffix = static_body.split(b'"text":""', 1)
+        self._body_prefix += b'"text":'
+        # Endpoint paths (relative to the client's base_url) are fixed for the life of the service.
+        model_path = f"/v1beta/models/{settings.LLM_MODEL}"
+        self._generate_url = f"{model_path}:generateContent?key={settings.GEMINI_API_KEY}"
+        self._stream_url = f"{model_path}:streamGenerateContent?alt=sse&key={settings.GEMINI_API_KEY}"
+        # (language, digest of the normalized input) -> (expiry on the monotonic clock, reply)
+        self._response_cache: OrderedDict[tuple[str, str], tuple[float, str]] = OrderedDict()
+        # Identical prompts already in flight share one upstream call; the semaphore caps the rest.
+        # Keyed like the response cache, on the full prompt, so prompts that only share an opening never merge.
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        # Opt-in, size-bounded memoization of language detection for repeated short prompts.
+        cache_size = settings.LANGUAGE_DETECT_CACHE_SIZE
+        self._detect_cached = lru_cache(maxsize=cache_size)(self._detect_language) if cache_size > 0 else None
         logger.info("LLM Service configured for Google Gemini API.")
 
     async def initialize(self):
         if self._initialized: return
         if not settings.GEMINI_API_KEY:
             logger.warning("GEMINI_API_KEY is not set. LLM service will use fallback responses.")
-            self._initialized = True
-            return
-        try:
-            self.client = httpx.AsyncClient(timeout=45.0)
-            self._initialized = True
-            logger.info("Gemini API client initialized successfully.")
-        except Exception as e:
-            logger.error(f"Failed to initialize Gemini API client: {e}", exc_info=True)
+        else:
+            try:
+                # One long-lived HTTP/2 client: TLS is negotiated once and concurrent calls multiplex over it.
+                self.client = httpx.AsyncClient(
+                    base_url=GEMINI_BASE_URL,
+                    http2=True,
+                    # Generation can take a while to produce the body; everything else should be quick.
+                    timeout=httpx.Timeout(connect=2.0, read=45.0, write=5.0, pool=5.0),
+                    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60.0),
+                )
+                logger.info("Gemini API client initialized successfully.")
+            except Exception as e:
+                logger.error(f"Failed to initialize Gemini API client: {e}", exc_info=True)
+                return
+        # Unpacking the langid model takes a couple of seconds; do it now, not on the first request.
+        # The client already exists, so text requests arriving meanwhile still reach Gemini.
+        await asyncio.to_thread(_language_identifier)
+        self._initialized = True
 
     def is_initialized(self) -> bool:
         return self._initialized
 
-    def _clean_response(self, text: str) -> str:
-        text = re.sub(r'[\*#\-]', '', text)
-        return re.sub(r'\s+', ' ', text).strip()
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _clean_response(text: str) -> str:
+        text = _MARKDOWN_RE.sub('', text)
+        text = text.strip()
+        # Anchored: .match only tries position 0, and slicing skips the substitution machinery.
+        if artifact := _ARTIFACT_RE.match(text):
+            text = text[artifact.end():]
+        return _WS_RE.sub(' ', text).strip()
+
+    def clean_response(self, text: str) -> str:
+        """Normalizes a raw reply (markdown, label prefixes, whitespace) the same way cached replies are."""
+        return self._clean_response(text)
+
+    def _request_body(self, user_input: str) -> bytes:
+        return self._body_prefix + orjson.dumps(user_input) + self._body_suffix
+
+    @staticmethod
+    def _retry_delay(response: httpx.Response, attempt: int) -> float:
+        """Honors a numeric Retry-After header, otherwise backs off exponentially with jitter."""
+        try:
+            delay = float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            delay = RETRY_BASE_DELAY * 2 ** attempt + random.uniform(0, 0.1)
+        return min(delay, RETRY_MAX_DELAY)
+
+    def _cache_key(self, user_input: str, language: str) -> tuple[str, str]:
+        # The whole normalized prompt is hashed: questions sharing a long opening still get their own entry,
+        # while every key stays a fixed 32 hex characters however long the prompt.
+        normalized = _WS_RE.sub(' ', user_input.strip().lower())
+        return language, hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+    def _cached_response(self, key: tuple[str, str] | None) -> str | None:
+        entry = self._response_cache.get(key) if key is not None else None
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._response_cache[key]
+            return None
+        self._response_cache.move_to_end(key)
+        return entry[1]
+
+    def _remember_response(self, key: tuple[str, str], response_text: str):
+        self._response_cache[key] = (time.monotonic() + settings.LLM_RESPONSE_CACHE_TTL, response_text)
+        if len(self._response_cache) > settings.LLM_RESPONSE_CACHE_SIZE:
+            self._response_cache.popitem(last=False)
 
     async def get_response(self, user_input: str, language: str = "en") -> str:
         if not self.client:
             return self._get_fallback_response(language)
+        # Repeated devotional prompts ("who are you", greetings) are answered from memory.
+        # Cache access never spans an await, so the event loop needs no lock around it.
+        cache_key = self._cache_key(user_input, language) if settings.LLM_RESPONSE_CACHE_SIZE > 0 else None
+        if (cached := self._cached_response(cache_key)) is not None:
+            return cached
+        if cache_key is None:
+            return await self._generate(user_input, language, None)
+        pending = self._inflight.get(cache_key)
+        if pending is None:
+            pending = self._inflight[cache_key] = asyncio.ensure_future(self._generate(user_input, language, cache_key))
+            pending.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        # Shielded so one caller disconnecting does not cancel the call for everyone waiting on it.
+        return await asyncio.shield(pending)
+
+    async def _generate(self, user_input: str, language: str, cache_key: tuple[str, str] | None) -> str:
         try:
-            gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/{settings.LLM_MODEL}:generateContent?key={settings.GEMINI_API_KEY}"
-            payload = {
-                "systemInstruction": {"parts": [{"text": self.system_instruction}]},
-                "contents": [{"role": "user", "parts": [{"text": user_input}]}],
-                "generationConfig": {"temperature": 0.7, "topP": 0.95, "maxOutputTokens": 256}
-            }
-            response = await self.client.post(gemini_url, json=payload)
+            for attempt in range(LLM_MAX_ATTEMPTS):
+                async with self._semaphore:
+                    response = await self.client.post(self._generate_url, content=self._request_body(user_input), headers=JSON_HEADERS)
+                if response.status_code not in RETRY_STATUSES or attempt == LLM_MAX_ATTEMPTS - 1:
+                    break
+                delay = self._retry_delay(response, attempt)
+                logger.warning(f"Gemini API returned {response.status_code}; retrying in {delay:.2f}s (attempt {attempt + 1}/{LLM_MAX_ATTEMPTS})")
+                await asyncio.sleep(delay)
             response.raise_for_status()
-            result = response.json()
-            candidates = result.get("candidates", [])
-            if candidates and candidates[0].get("content", {}).get("parts"):
-                return self._clean_response(candidates[0]["content"]["parts"][0].get("text", ""))
-            return self._get_fallback_response(language)
+            text = _candidate_text(orjson.loads(response.content))
+            if text is None:
+                return self._get_fallback_response(language)
+            response_text = self._clean_response(text)
+            if cache_key is not None and response_text:
+                self._remember_response(cache_key, response_text)
+            return response_text
         except httpx.HTTPStatusError as e:
             logger.error(f"Gemini API HTTP error: {e.response.status_code} - {e.response.text}", exc_info=True)
             return self._get_fallback_response(language)
@@ -64,9 +245,60 @@ class GaneshaLLMService:
             logger.error(f"An unexpected error in get_response: {e}", exc_info=True)
             return self._get_fallback_response(language)
 
-    # In services/llm.py
+    async def stream_response(self, user_input: str, language: str = "en") -> AsyncIterator[str]:
+        """
+        Yields Ganesha's reply as text deltas from Gemini's SSE streaming endpoint, so callers
+        can start work at first-token time instead of waiting for the full generation.
+        """
+        if not self.client:
+            yield self._get_fallback_response(language)
+            return
+        cache_key = self._cache_key(user_input, language) if settings.LLM_RESPONSE_CACHE_SIZE > 0 else None
+        if (cached := self._cached_response(cache_key)) is not None:
+            yield cached
+            return
+        deltas: list[str] = []
+        completed = False
+        try:
+            async with self._semaphore, self.client.stream("POST", self._stream_url, content=self._request_body(user_input), headers=JSON_HEADERS) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    text = _candidate_text(orjson.loads(line[5:]))
+                    delta = _MARKDOWN_RE.sub('', text) if text else ""
+                    if delta:
+                        deltas.append(delta)
+                        yield delta
+            completed = True
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Gemini API HTTP error while streaming: {e.response.status_code}", exc_info=True)
+        except Exception as e:
+            logger.error(f"An unexpected error in stream_response: {e}", exc_info=True)
+        if not deltas:
+            yield self._get_fallback_response(language)
+        # A reply cut short by a dropped stream must not be served from the cache.
+        elif completed and cache_key is not None:
+            self._remember_response(cache_key, self._clean_response("".join(deltas)))
 
     def detect_language_fast(self, text: str) -> str:
+        """
+        Detects the language of `text`. When LANGUAGE_DETECT_CACHE_SIZE is set, results
+        are memoized on the first LANGUAGE_DETECT_PREFIX characters of the input.
+        """
+        if self._detect_cached is not None:
+            return self._detect_cached(text[:LANGUAGE_DETECT_PREFIX])
+        return self._detect_language(text)
+
+    @staticmethod
+    def _disambiguate_devanagari(text: str) -> str:
+        """Tells Hindi from Marathi (both Devanagari) by counting marker words; ties go to Hindi."""
+        tokens = text.translate(_PUNCT_TO_SPACE).split()
+        hi_hits = sum(token in _HI_MARKERS for token in tokens)
+        mr_hits = sum(token in _MR_MARKERS for token in tokens)
+        return 'mr' if mr_hits > hi_hits else 'hi'
+
+    def _detect_language(self, text: str) -> str:
         """
         A robust, multi-stage language detector that prioritizes script detection
         for high accuracy on native Indian languages.
@@ -74,62 +306,52 @@ class GaneshaLLMService:
         text = text.lower().strip()
 
         # Stage 1: Check for native scripts for a guaranteed match. This is the most reliable method.
-        script_ranges = {
-            'ur': range(0x0600, 0x06FF + 1), 'hi': range(0x0900, 0x097F + 1),
-            'bn': range(0x0980, 0x09FF + 1), 'pa': range(0x0A00, 0x0A7F + 1),
-            'gu': range(0x0A80, 0x0AFF + 1), 'ta': range(0x0B80, 0x0BFF + 1),
-            'te': range(0x0C00, 0x0C7F + 1), 'kn': range(0x0C80, 0x0CFF + 1),
-            'ml': range(0x0D00, 0x0D7F + 1),
-        }
-        detected_lang = None
-        for lang, script_range in script_ranges.items():
-            if any(ord(char) in script_range for char in text):
-                detected_lang = lang
-                break
+        # Pure-ASCII text (English, Hinglish, Tanglish) has no native script, so skip the scan.
+        if text.isascii():
+            detected_lang = None
+        elif len(text) <= SHORT_TEXT_LENGTH:
+            # Typical chat turns: too short to amortize the NumPy pass, so count script hits with the regex.
+            # Same rule as below: the dominant script wins, ties going to the earlier entry in _SCRIPT_RANGES.
+            counts = Counter(match.lastgroup for match in _SCRIPT_RE.finditer(text))
+            detected_lang = max(_SCRIPT_LANGUAGES, key=counts.__getitem__) if counts else None
+        else:
+            # Longer text: one vectorized pass tags every code point, then the dominant script wins.
+            codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+            counts = np.bincount(_SCRIPT_TABLE[np.minimum(codes, 0xFFFF)], minlength=len(_SCRIPT_LANGUAGES) + 1)
+            counts[0] = 0
+            detected_lang = _SCRIPT_LANGUAGES[counts.argmax() - 1] if counts.any() else None
+        if detected_lang == 'hi':
+            detected_lang = self._disambiguate_devanagari(text)
         
         if detected_lang:
             logger.info(f"Script detection found language: '{detected_lang}'")
             return detected_lang
 
+        # Text without any letters (numbers, emoji, punctuation) carries no language signal;
+        # skip the comparatively expensive langid scoring for it.
+        if not _LETTER_RE.search(text):
+            logger.info("No letters to classify; defaulting to English ('en').")
+            return 'en'
+
         # Stage 2: If no native script is found, use langid for transliterated text (Tanglish, Hinglish).
         try:
-            # Constrain langid to only the languages you support for better accuracy
-            supported_lang_codes = list(settings.SUPPORTED_LANGUAGES.keys())
-            langid.set_languages(supported_lang_codes)
-            
-            lang_code, confidence = langid.classify(text)
+            lang_code, confidence = _language_identifier().classify(text)
             logger.info(f"langid detected '{lang_code}' with confidence {confidence:.2f} for: '{text[:50]}...'")
             # We can be more lenient with confidence here as we're just providing a hint to the LLM
             if lang_code in settings.SUPPORTED_LANGUAGES:
                 return lang_code
         except Exception as e:
             logger.warning(f"langid detection failed: {e}. Defaulting to English.")
-        finally:
-            # IMPORTANT: Reset langid to its default state if you constrained it
-            langid.set_languages(None)
             
         # Stage 3: Default to English if all else fails
         logger.info("Defaulting to English ('en') as no specific language was detected.")
         return 'en'
     def _get_fallback_response(self, language: str) -> str:
-        fallbacks = {
-            "en": "Om Gam Ganapataye Namaha! I am here to help you, dear devotee. Please share what's on your mind, and I shall guide you with wisdom and compassion.",
-            
-            "hi": "ॐ गं गणपतये नमः! मैं यहाँ आपकी सहायता के लिए हूँ, प्रिय भक्त। कृपया बताएं कि आपके मन में क्या है, और मैं आपको ज्ञान और करुणा से मार्गदर्शन दूंगा।",
-            
-            "ta": "ஓம் கம் கணபதயே நமக! நான் உங்களுக்கு உதவ இங்கே இருக்கிறேன், அன்பு பக்தரே। உங்கள் மனதில் என்ன இருக்கிறது என்று பகிர்ந்து கொள்ளுங்கள், நான் ஞானம் மற்றும் கருணையுடன் உங்களுக்கு வழிகாட்டுவேன்।",
-            
-            "te": "ఓం గం గణపతయే నమః! నేను మీకు సహాయం చేయడానికి ఇక్కడ ఉన్నాను, ప్రియమైన భక్తుడా। మీ మనస్సులో ఏమి ఉందో చెప్పండి, నేను జ్ఞానం మరియు కరుణతో మీకు మార్గదర్శనం చేస్తాను।",
-            
-            "kn": "ಓಂ ಗಂ ಗಣಪತಯೇ ನಮಃ! ನಾನು ನಿಮಗೆ ಸಹಾಯ ಮಾಡಲು ಇಲ್ಲಿದ್ದೇನೆ, ಪ್ರಿಯ ಭಕ್ತರೇ। ನಿಮ್ಮ ಮನಸ್ಸಿನಲ್ಲಿ ಏನಿದೆ ಎಂದು ಹಂಚಿಕೊಳ್ಳಿ, ನಾನು ಜ್ಞಾನ ಮತ್ತು ಕರುಣೆಯಿಂದ ನಿಮಗೆ ಮಾರ್ಗದರ್ಶನ ನೀಡುತ್ತೇನೆ।",
-            
-            "ml": "ഓം ഗം ഗണപതയേ നമഃ! നിങ്ങളെ സഹായിക്കാൻ ഞാൻ ഇവിടെയുണ്ട്, പ്രിയ ഭക്തനേ। നിങ്ങളുടെ മനസ്സിൽ എന്താണുള്ളതെന്ന് പങ്കിടുക, ഞാൻ ജ്ഞാനവും കരുണയും കൊണ്ട് നിങ്ങളെ നയിക്കും।",
-            
-            "bn": "ওম গং গণপতয়ে নমঃ! আমি এখানে আপনাকে সাহায্য করতে এসেছি, প্রিয় ভক্ত। আপনার মনে কী আছে তা শেয়ার করুন, আমি জ্ঞান ও করুণা দিয়ে আপনাকে পথ দেখাবো।",
-            
-            "mr": "ॐ गं गणपतये नमः! मी तुमची मदत करण्यासाठी येथे आहे, प्रिय भक्ता। तुमच्या मनात काय आहे ते सांगा, मी ज्ञान आणि करुणेने तुम्हाला मार्गदर्शन करीन।",
-        }
-        return fallbacks.get(language, fallbacks["en"])
+        return _FALLBACK_RESPONSES.get(language, _FALLBACK_RESPONSES["en"])
+
+    def fallback_responses(self) -> Mapping[str, str]:
+        """The stock replies served when Gemini is unavailable, by language."""
+        return _FALLBACK_RESPONSES
 
 llm_service = GaneshaLLMService()
 
@@ -1,35 +1,288 @@
 import os
+import hashlib
+import shutil
+import tempfile
 import logging
+from pathlib import Path
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, List, Mapping, Optional
+import aiofiles
 import edge_tts
 import asyncio
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from config import settings
 
 logger = logging.getLogger(__name__)
 
+TTS_RATE = "-4%"
+STREAM_CHUNK_SIZE = 64 * 1024
+TTS_IO_WORKERS = 4
+# Markdown characters that would otherwise be read aloud; single-char deletes go through str.translate.
+_MARKDOWN_STRIP = str.maketrans('', '', '*#`')
+_WS_RE = re.compile(r'\s+')
+# Replies of TTS_SPLIT_MIN_CHARS or more are synthesized, and cached, one sentence at a time,
+# with at most TTS_MAX_PARALLEL_CHUNKS of a reply's sentences in flight at once.
+TTS_SPLIT_MIN_CHARS = 200
+TTS_MAX_PARALLEL_CHUNKS = 4
+# Sentence ends: Latin punctuation, Devanagari danda/double danda, Urdu full stop
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?।॥۔])\s+')
+_LETTER_RE = re.compile(r'[^\W\d_]')
+
+def _split_for_synthesis(text: str) -> List[str]:
+    if len(text) < TTS_SPLIT_MIN_CHARS:
+        return [text]
+    sentences: List[str] = []
+    leading = ""
+    for sentence in _SENTENCE_END_RE.split(text):
+        # Fragments with nothing to speak ("🙏", "...") get no audio from Edge TTS; keep them with a neighbour.
+        if _LETTER_RE.search(sentence):
+            sentences.append(f"{leading} {sentence}" if leading else sentence)
+            leading = ""
+        elif sentences:
+            sentences[-1] = f"{sentences[-1]} {sentence}"
+        else:
+            leading = f"{leading} {sentence}" if leading else sentence
+    return sentences or [text]
+
+@lru_cache(maxsize=2048)
+def _clip_name(cleaned_text: str, voice: str) -> str:
+    """Cache file name for a clip; repeated texts skip re-encoding and re-hashing."""
+    return hashlib.sha256(f"{voice}|{TTS_RATE}|{cleaned_text}".encode()).hexdigest() + ".mp3"
+
+def _read_clip(path: Path) -> bytes:
+    data = path.read_bytes()
+    # Refresh the clip's recency for prune_cache.
+    os.utime(path)
+    return data
+
+def _write_clip(path: Path, data: bytes):
+    # A unique temp name: two replies can share a sentence and miss the cache for it at the same time.
+    temp_path = None
+    try:
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=path.parent)
+        with os.fdopen(fd, "wb") as clip:
+            clip.write(data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning("Could not cache TTS audio at %s: %s", path, e)
+        if temp_path is not None:
+            Path(temp_path).unlink(missing_ok=True)
+
+# Bounds open Edge TTS connections across all requests; excess syntheses wait instead of piling up.
+_EDGE_TTS_SLOTS = asyncio.Semaphore(settings.TTS_MAX_CONCURRENCY)
+
+async def _audio_chunks(text: str, voice: str) -> AsyncIterator[bytes]:
+    async with _EDGE_TTS_SLOTS:
+        communicate = edge_tts.Communicate(text, voice, rate=TTS_RATE)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+
+async def _buffered_audio_chunks(text: str, voice: str) -> AsyncIterator[bytes]:
+    """
+    _audio_chunks for consumers paced by a client. Upstream chunks are queued as they arrive, so the
+    Edge TTS slot is released when synthesis finishes, not when a slow client has read the last byte.
+    A clip is capped at TTS_MAX_CHARS, which bounds the queue.
+    """
+    queue: asyncio.Queue[Optional[bytes]] = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for data in _audio_chunks(text, voice):
+                queue.put_nowait(data)
+        finally:
+            queue.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while (data := await queue.get()) is not None:
+            yield data
+        # Surfaces a synthesis failure to the caller once the audio received so far is out.
+        await producer
+    finally:
+        producer.cancel()
+
+async def _synthesize_bytes(text: str, voice: str) -> bytes:
+    return b"".join([data async for data in _audio_chunks(text, voice)])
+
+# Edge TTS voice per language, frozen at import
+_VOICE_MAPPING = MappingProxyType({
+    "en": "en-IN-PrabhatNeural", "hi": "hi-IN-MadhurNeural",
+    "ta": "ta-IN-ValluvarNeural", "te": "te-IN-MohanNeural",
+    "kn": "kn-IN-GaganNeural", "ml": "ml-IN-MidhunNeural",
+    "bn": "bn-IN-BashkarNeural", "mr": "mr-IN-ManoharNeural",
+    "gu": "gu-IN-NiranjanNeural", "pa": "pa-IN-GurpreetNeural",
+    "ur": "ur-IN-SalmanNeural",
+})
+DEFAULT_VOICE = _VOICE_MAPPING["en"]
+
 class TTSService:
     def __init__(self):
-        self.voice_mapping = {
-            "en": "en-IN-PrabhatNeural", "hi": "hi-IN-MadhurNeural",
-            "ta": "ta-IN-ValluvarNeural", "te": "te-IN-MohanNeural",
-            "kn": "kn-IN-GaganNeural", "ml": "ml-IN-MidhunNeural",
-            "bn": "bn-IN-BashkarNeural", "mr": "mr-IN-ManoharNeural",
-            "gu": "gu-IN-NiranjanNeural", "pa": "pa-IN-GurpreetNeural",
-            "ur": "ur-IN-SalmanNeural",
-        }
+        self.voice_mapping = _VOICE_MAPPING
+        # Finished MP3s are kept on disk by content hash, so repeated replies skip Edge TTS entirely.
+        self.cache_dir = Path(settings.TTS_CACHE_DIR)
+        self.cache_enabled = settings.TTS_CACHE_MAX_MB > 0
+        # Cache path -> synthesis in progress, so concurrent requests for one clip call Edge TTS once.
+        self._inflight: Dict[Path, asyncio.Future] = {}
+        # Cache and temp-file syscalls run on their own small pool, so a burst of TTS work cannot
+        # starve the default executor (which aiofiles and the rest of the app share).
+        self._pool = ThreadPoolExecutor(max_workers=TTS_IO_WORKERS, thread_name_prefix="tts-io")
         logger.info("TTS Service initialized using Edge TTS.")
 
     async def initialize(self):
+        if self.cache_enabled:
+            await self._run_io(partial(self.cache_dir.mkdir, parents=True, exist_ok=True))
         logger.info("TTS Service is ready.")
 
     def is_initialized(self) -> bool:
         return True
 
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+    async def _run_io(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    async def prewarm(self, phrases: Mapping[str, str]):
+        """
+        Synthesizes stock phrases (language -> text) into the clip cache in the background,
+        so the first request that needs one is served from disk instead of Edge TTS.
+        """
+        if not self.cache_enabled:
+            return
+        warmed = 0
+        for language, text in phrases.items():
+            cleaned_text = self._clean_text_for_tts(text)
+            voice = self.voice_mapping.get(language, DEFAULT_VOICE)
+            cached = self._cache_path(cleaned_text, voice)
+            if await self._run_io(cached.exists):
+                continue
+            # One phrase at a time, so warmup never competes with live requests for Edge TTS slots.
+            if await self._synthesize(cleaned_text, voice, str(cached), None):
+                warmed += 1
+        logger.info("TTS cache prewarmed with %d new clips.", warmed)
+
     def _clean_text_for_tts(self, text: str) -> str:
-        text = re.sub(r'[*#`]', '', text)
-        text = re.sub(r'\s+', ' ', text).strip()
+        # Bound the cleanup work (and the memo key) before anything else touches oversized input.
+        return self._clean_bounded_text(text[:2 * settings.TTS_MAX_CHARS])
+
+    @staticmethod
+    @lru_cache(maxsize=2048)
+    def _clean_bounded_text(text: str) -> str:
+        max_chars = settings.TTS_MAX_CHARS
+        text = _WS_RE.sub(' ', text.translate(_MARKDOWN_STRIP)).strip()
+        if len(text) > max_chars:
+            logger.warning("TTS input truncated from %d to %d chars", len(text), max_chars)
+            text = text[:max_chars].rsplit(' ', 1)[0]
         return text
 
+    def _cache_path(self, cleaned_text: str, voice: str) -> Path:
+        return self.cache_dir / _clip_name(cleaned_text, voice)
+
+    @staticmethod
+    def _restore_from_cache(cached: Path, output_path: str) -> bool:
+        """Copies a cached clip to output_path. False on a miss."""
+        # A copy, not a hard link: a shared inode would make the utime below refresh every
+        # output linked to this clip, and the outputs sweep would never expire them.
+        try:
+            shutil.copyfile(cached, output_path)
+        except FileNotFoundError:
+            return False
+        # Refresh the clip's recency for prune_cache.
+        os.utime(cached)
+        return True
+
+    @staticmethod
+    def _store_in_cache(output_path: str, cached: Path):
+        # Copied for the same reason _restore_from_cache copies: cache and outputs must not share inodes.
+        # _write_clip renames into place, so readers never see a half-written clip.
+        try:
+            _write_clip(cached, Path(output_path).read_bytes())
+        except OSError as e:
+            # Caching is best-effort; the clip at output_path is still good.
+            logger.warning("Could not cache TTS audio at %s: %s", cached, e)
+
+    def prune_cache(self) -> int:
+        """Deletes the least recently used clips until the cache fits in TTS_CACHE_MAX_MB."""
+        if not self.cache_enabled:
+            return 0
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                clips = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in entries if entry.is_file()]
+        except FileNotFoundError:
+            return 0
+        total = sum(size for _, size, _ in clips)
+        budget = settings.TTS_CACHE_MAX_MB * 1024 * 1024
+        removed = 0
+        for _, size, path in sorted(clips):
+            if total <= budget:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    async def _sentence_audio(self, sentence: str, voice: str) -> bytes:
+        """
+        Audio for one sentence of a long reply. Openings and blessings recur across replies
+        far more often than whole replies do, so sentences are cached on their own.
+        """
+        if not self.cache_enabled:
+            return await _synthesize_bytes(sentence, voice)
+        cached = self._cache_path(sentence, voice)
+        try:
+            return await self._run_io(_read_clip, cached)
+        except FileNotFoundError:
+            pass
+        data = await _synthesize_bytes(sentence, voice)
+        if data:
+            await self._run_io(_write_clip, cached, data)
+        return data
+
+    async def _reply_audio(self, cleaned_text: str, sentences: List[str], voice: str) -> List[bytes]:
+        """
+        Long replies: sentences are fetched concurrently, so wall-clock is the slowest sentence
+        rather than the sum. Edge TTS emits raw MP3 frames, which concatenate cleanly. If any
+        sentence fails, the reply is synthesized in one piece rather than losing its audio.
+        """
+        slots = asyncio.Semaphore(TTS_MAX_PARALLEL_CHUNKS)
+
+        async def sentence_audio(sentence: str) -> bytes:
+            async with slots:
+                return await self._sentence_audio(sentence, voice)
+
+        parts = await asyncio.gather(*(sentence_audio(sentence) for sentence in sentences), return_exceptions=True)
+        if all(isinstance(part, bytes) and part for part in parts):
+            return parts
+        failure = next((part for part in parts if isinstance(part, BaseException)), "no audio")
+        logger.warning("Sentence synthesis failed (%s); synthesizing the reply in one piece", failure)
+        return [await _synthesize_bytes(cleaned_text, voice)]
+
+    async def generate_speech_stream(self, text: str, language: str) -> AsyncIterator[bytes]:
+        """
+        Yields MP3 bytes as they become available, so clients can start playback before
+        synthesis finishes. Cached clips are streamed from disk.
+        """
+        cleaned_text = self._clean_text_for_tts(text)
+        if not cleaned_text:
+            return
+        voice = self.voice_mapping.get(language, DEFAULT_VOICE)
+        if self.cache_enabled:
+            try:
+                async with aiofiles.open(self._cache_path(cleaned_text, voice), "rb") as clip:
+                    while data := await clip.read(STREAM_CHUNK_SIZE):
+                        yield data
+                return
+            except FileNotFoundError:
+                pass
+        async for data in _buffered_audio_chunks(cleaned_text, voice):
+            yield data
+
     async def generate_speech(self, text: str, language: str, output_path: str) -> bool:
         """
         Generates speech directly as an MP3 file to remove the dependency on FFmpeg.
@@ -44,21 +297,59 @@ class TTSService:
             logger.error("Text is empty after cleaning, cannot generate speech.")
             return False
 
+        voice = self.voice_mapping.get(language, DEFAULT_VOICE)
+        if not self.cache_enabled:
+            return await self._synthesize(cleaned_text, voice, output_path, None)
+        cached = self._cache_path(cleaned_text, voice)
+        try:
+            if await self._run_io(self._restore_from_cache, cached, output_path):
+                logger.info("Served TTS audio from cache: %s", output_path)
+                return True
+        except OSError as e:
+            logger.warning("TTS cache read failed for %s: %s", cached, e)
+        pending = self._inflight.get(cached)
+        if pending is not None:
+            # The same clip is already being synthesized for another session; reuse it once it lands.
+            if await asyncio.shield(pending):
+                try:
+                    return await self._run_io(self._restore_from_cache, cached, output_path)
+                except OSError as e:
+                    logger.warning("TTS cache read failed for %s: %s", cached, e)
+            return False
+        pending = self._inflight[cached] = asyncio.ensure_future(self._synthesize(cleaned_text, voice, output_path, cached))
+        pending.add_done_callback(lambda _: self._inflight.pop(cached, None))
+        return await asyncio.shield(pending)
+
+    async def _synthesize(self, cleaned_text: str, voice: str, output_path: str, cached: Optional[Path]) -> bool:
         try:
-            voice = self.voice_mapping.get(language, self.voice_mapping["en"])
-            
             # Generate and save the audio directly to the final destination path.
-            communicate = edge_tts.Communicate(cleaned_text, voice, rate="-4%")
-            await communicate.save(output_path)
+            # Chunks are written through aiofiles so disk writes never stall the event loop.
+            chunks = _split_for_synthesis(cleaned_text)
+            bytes_written = 0
+            # Written under a temporary name and renamed when complete, so a failed or cancelled
+            # synthesis never leaves a truncated clip at output_path (or, via the cache, for later requests).
+            temp_path = output_path + ".tmp"
+            async with aiofiles.open(temp_path, "wb") as audio_file:
+                if len(chunks) == 1:
+                    async for data in _audio_chunks(cleaned_text, voice):
+                        bytes_written += await audio_file.write(data)
+                else:
+                    for part in await self._reply_audio(cleaned_text, chunks, voice):
+                        bytes_written += await audio_file.write(part)
 
-            if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
-                logger.error(f"Edge TTS failed to create a valid output file: {output_path}")
+            if not bytes_written:
+                logger.error("Edge TTS returned no audio for: %s", output_path)
+                await self._run_io(partial(Path(temp_path).unlink, missing_ok=True))
                 return False
+            await self._run_io(os.replace, temp_path, output_path)
             
-            logger.info(f"Successfully generated TTS audio: {output_path}")
+            if cached is not None:
+                await self._run_io(self._store_in_cache, output_path, cached)
+            logger.info("Successfully generated TTS audio: %s", output_path)
             return True
         except Exception as e:
-            logger.error(f"TTS generation failed for text '{cleaned_text[:50]}...': {e}", exc_info=True)
+            logger.error("TTS generation failed for text '%s...': %s", cleaned_text[:50], e, exc_info=True)
+            await self._run_io(partial(Path(output_path + ".tmp").unlink, missing_ok=True))
             return False
 
 tts_service = TTSService()